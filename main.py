@@ -1,24 +1,130 @@
 import os
-from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import asyncio
+import email.message
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import List, Optional, Dict, Any, Type
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, EmailStr
-from database import db, create_document, get_documents
-from schemas import User, Portfolio, PortfolioSection, AIGenerateInput, AIGenerateResult
-import requests
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, EmailStr, ValidationError
+from database import db, create_document, upsert_document
+from schemas import PortfolioSection, AIGenerateInput, AIGenerateResult
+from main_helpers import parse_suggestions, structure_projects, structure_experience, structure_education
+import httpx
+import orjson
+from cachetools import TTLCache
 
-app = FastAPI(title="AI Portfolio Builder API")
+app = FastAPI(title="AI Portfolio Builder API", default_response_class=ORJSONResponse)
+
+# Comma-separated list of frontend origins; defaults to any origin when unset
+CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
 
+def _is_json_content_type(value: Optional[str]) -> bool:
+    # Same rule as FastAPI: missing, application/json or application/*+json
+    if not value:
+        return True
+    message = email.message.Message()
+    message["content-type"] = value
+    if message.get_content_maintype() != "application":
+        return False
+    subtype = message.get_content_subtype()
+    return subtype == "json" or subtype.endswith("+json")
+
+
+def _body_errors(e: ValidationError):
+    return [{**err, "loc": ("body", *err["loc"])} for err in e.errors()]
+
+
+def json_body(model: Type[BaseModel]):
+    """Dependency that parses and validates the raw JSON body in a single pydantic-core pass.
+
+    Errors mirror what FastAPI raises for a regular body parameter, so clients see
+    the same 422 payloads.
+    """
+    async def parsed_body(request: Request):
+        body = await request.body()
+        if not body:
+            error = ValidationError.from_exception_data(
+                "Field required", [{"type": "missing", "loc": ("body",), "input": {}}]
+            ).errors()[0]
+            error["input"] = None
+            raise RequestValidationError([error])
+        if not _is_json_content_type(request.headers.get("content-type")):
+            # FastAPI validates the raw bytes here, which always fails for a model
+            try:
+                return model.model_validate(body)
+            except ValidationError as e:
+                raise RequestValidationError(_body_errors(e), body=body)
+        try:
+            return model.model_validate_json(body)
+        except ValidationError as e:
+            if any(err["type"] == "json_invalid" for err in e.errors()):
+                # Reproduce FastAPI's decode error (position and message from the json module)
+                try:
+                    json.loads(body)
+                except json.JSONDecodeError as je:
+                    raise RequestValidationError(
+                        [{
+                            "type": "json_invalid",
+                            "loc": ("body", je.pos),
+                            "msg": "JSON decode error",
+                            "input": {},
+                            "ctx": {"error": je.msg},
+                        }],
+                        body=je.doc,
+                    )
+            raise RequestValidationError(_body_errors(e))
+    return parsed_body
+
+
+def json_body_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """openapi_extra documenting the body read by json_body(model).
+
+    Nested $defs are inlined since OpenAPI resolves $ref from the document root.
+    """
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+
+    def resolve(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return resolve(defs[node["$ref"].rsplit("/", 1)[-1]])
+            return {k: resolve(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [resolve(v) for v in node]
+        return node
+
+    return {"requestBody": {"content": {"application/json": {"schema": resolve(schema)}}, "required": True}}
+
+
+@app.on_event("startup")
+def ensure_indexes():
+    if db is None:
+        return
+    try:
+        db.portfolio.create_index("username", unique=True)
+        db.uploads.create_index("filename")
+    except Exception:
+        # Don't block startup if the database is unreachable; lookups still work unindexed
+        pass
+
+
 @app.get("/")
 def read_root():
     return {"message": "AI Portfolio Builder Backend Running"}
@@ -57,74 +163,174 @@ class AISuggestRequest(BaseModel):
 
 AI_PROVIDER_URL = os.getenv("AI_API_URL")
 AI_API_KEY = os.getenv("AI_API_KEY")
+# Ask for summary and suggestions in one delimited completion; set to "0" for the two-call path
+AI_COMBINED_PROMPT = os.getenv("AI_COMBINED_PROMPT", "1") != "0"
+
+_FALLBACK_SUMMARY = (
+    "Professional, impact-driven candidate. Blends technical depth with clear communication, "
+    "drives outcomes through projects, internships, and community work. Values clarity, "
+    "collaboration, and continuous learning."
+)
+_DRAFT_UNAVAIL_PREFIX = "Draft (AI service unavailable): "
+_DRAFT_ERROR_PREFIX = "Draft (AI error): "
+_DRAFT_PREFIXES = (_DRAFT_UNAVAIL_PREFIX, _DRAFT_ERROR_PREFIX)
+
+
+def _draft(prefix: str, prompt: str) -> str:
+    return prefix + prompt[:280] + "..."
+
+# Shared client so provider calls reuse pooled keep-alive (HTTP/2) connections.
+# A strict timeout keeps a slow provider from pinning requests indefinitely.
+_llm_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(float(os.getenv("AI_TIMEOUT", "5")), connect=1.0),
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+)
 
+LLM_MAX_ATTEMPTS = 3
+# Circuit breaker: after 5 consecutive failures, skip the provider for 30s
+_BREAKER_THRESHOLD = 5
+_BREAKER_COOLDOWN = 30.0
+_breaker = {"fail": 0, "open_until": 0.0}
+# In-flight provider requests keyed by prompt hash
+_inflight: Dict[bytes, asyncio.Future] = {}
+# Successful completions by prompt hash; the TTL lets prompt changes roll out within the hour
+_llm_cache = TTLCache(maxsize=4096, ttl=3600)
 
-def call_llm(prompt: str) -> str:
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    await _llm_client.aclose()
+
+
+def _record_llm_result(ok: bool):
+    if ok:
+        _breaker["fail"] = 0
+        return
+    _breaker["fail"] += 1
+    if _breaker["fail"] >= _BREAKER_THRESHOLD:
+        _breaker["open_until"] = time.monotonic() + _BREAKER_COOLDOWN
+
+
+async def _request_llm(prompt: str, key: bytes) -> str:
+    """Send one prompt to the provider with retries, honouring the circuit breaker."""
+    if time.monotonic() < _breaker["open_until"]:
+        return _draft(_DRAFT_UNAVAIL_PREFIX, prompt)
+    try:
+        for attempt in range(LLM_MAX_ATTEMPTS):
+            try:
+                resp = await _llm_client.post(
+                    AI_PROVIDER_URL,
+                    headers={"Authorization": f"Bearer {AI_API_KEY}", "Content-Type": "application/json"},
+                    json={"prompt": prompt, "max_tokens": 600}
+                )
+                break
+            except (httpx.TimeoutException, httpx.TransportError):
+                if attempt == LLM_MAX_ATTEMPTS - 1:
+                    raise
+                # Jittered exponential backoff between attempts
+                await asyncio.sleep(0.1 * 2 ** attempt + random.random() * 0.05)
+        if resp.is_success:
+            data = resp.json()
+            # Expect {"text": "..."} or OpenAI-like choices
+            if isinstance(data, dict) and data.get("text"):
+                _record_llm_result(True)
+                _llm_cache[key] = data["text"]
+                return data["text"]
+            if data.get("choices"):
+                _record_llm_result(True)
+                _llm_cache[key] = data["choices"][0]["text"]
+                return data["choices"][0]["text"]
+        _record_llm_result(False)
+        return _draft(_DRAFT_UNAVAIL_PREFIX, prompt)
+    except Exception:
+        _record_llm_result(False)
+        return _draft(_DRAFT_ERROR_PREFIX, prompt)
+
+
+async def call_llm(prompt: str) -> str:
     """Call external LLM provider if configured; otherwise return a heuristic draft."""
     if AI_PROVIDER_URL and AI_API_KEY:
-        try:
-            resp = requests.post(
-                AI_PROVIDER_URL,
-                headers={"Authorization": f"Bearer {AI_API_KEY}", "Content-Type": "application/json"},
-                json={"prompt": prompt, "max_tokens": 600}
-            )
-            if resp.ok:
-                data = resp.json()
-                # Expect {"text": "..."} or OpenAI-like choices
-                if isinstance(data, dict) and data.get("text"):
-                    return data["text"]
-                if data.get("choices"):
-                    return data["choices"][0]["text"]
-            return f"Draft (AI service unavailable): {prompt[:280]}..."
-        except Exception:
-            return f"Draft (AI error): {prompt[:280]}..."
+        # Serve repeats from cache, then single-flight: concurrent callers with the
+        # same prompt share one provider request
+        key = hashlib.sha1(prompt.encode()).digest()
+        cached_text = _llm_cache.get(key)
+        if cached_text is not None:
+            return cached_text
+        task = _inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(_request_llm(prompt, key))
+            _inflight[key] = task
+            task.add_done_callback(lambda _: _inflight.pop(key, None))
+        # Shield so one caller disconnecting doesn't cancel the request for the others
+        return await asyncio.shield(task)
     # Fallback locally crafted summary
-    return (
-        "Professional, impact-driven candidate. Blends technical depth with clear communication, "
-        "drives outcomes through projects, internships, and community work. Values clarity, "
-        "collaboration, and continuous learning."
-    )
+    return _FALLBACK_SUMMARY
 
 
 # ---- API: AI generation endpoints ----
 
-@app.post("/api/generate", response_model=AIGenerateResult)
-def generate_portfolio(data: AIGenerateInput):
+# Static prompt text, built once at import; per-request work is a single format_map
+_SUMMARY_TMPL = (
+    "Write a {tone} 3-4 sentence professional summary for {name}. "
+    "Highlight strengths from skills: {skills}. Audience: recruiters and hiring managers."
+)
+_SUGGESTIONS_PROMPT = (
+    "Given the user's inputs (skills, projects, experience, education), suggest 5 concise improvements "
+    "that strengthen clarity, impact, and ATS readiness. Use imperative tone."
+)
+_COMBINED_TMPL = (
+    "Return two sections.\n"
+    "### SUMMARY\n"
+    "<3-4 sentence {tone} professional summary for {name} using skills: {skills}. "
+    "Audience: recruiters and hiring managers.>\n"
+    "### SUGGESTIONS\n"
+    "<5 concise imperative bullets, one per line, that strengthen clarity, impact, and ATS readiness "
+    "of the user's inputs (skills, projects, experience, education).>"
+)
+
+# No response_model: the result is trusted server-built data, so FastAPI's second
+# validation pass is intentionally skipped. Keep it that way on the portfolio getters too.
+@app.post("/api/generate", openapi_extra=json_body_schema(AIGenerateInput))
+async def generate_portfolio(data: AIGenerateInput = Depends(json_body(AIGenerateInput))):
     name = data.name.strip()
     if not name:
         raise HTTPException(status_code=400, detail="Name is required")
 
     # Compose prompts
     skills_str = ", ".join(data.skills) or "(skills not provided)"
-    projects_bullets = "\n".join(f"- {p}" for p in data.projects)
-    exp_bullets = "\n".join(f"- {e}" for e in data.experience)
-    edu_bullets = "\n".join(f"- {e}" for e in data.education)
-
-    summary_prompt = (
-        f"Write a {data.tone} 3-4 sentence professional summary for {name}. "
-        f"Highlight strengths from skills: {skills_str}. Audience: recruiters and hiring managers."
-    )
-    summary = call_llm(summary_prompt)
-
-    suggestions_prompt = (
-        "Given the user's inputs (skills, projects, experience, education), suggest 5 concise improvements "
-        "that strengthen clarity, impact, and ATS readiness. Use imperative tone."
-    )
-    suggestions_text = call_llm(suggestions_prompt)
-    suggestions = [s.strip("- • ") for s in suggestions_text.split("\n") if s.strip()][:5]
+    fields = {"tone": data.tone, "name": name, "skills": skills_str}
+
+    if AI_COMBINED_PROMPT:
+        combined = await call_llm(_COMBINED_TMPL.format_map(fields))
+        prefix = next((p for p in _DRAFT_PREFIXES if combined.startswith(p)), None)
+        if prefix:
+            # Provider failed and the draft echoes the combined template (delimiters included);
+            # rebuild the drafts the two-call path would have returned instead
+            summary = _draft(prefix, _SUMMARY_TMPL.format_map(fields))
+            suggestions_text = _draft(prefix, _SUGGESTIONS_PROMPT)
+        else:
+            head, sep, tail = combined.partition("### SUGGESTIONS")
+            if sep:
+                summary = head.replace("### SUMMARY", "", 1).strip()
+                suggestions_text = tail
+            else:
+                # Provider ignored the format, or no provider is configured
+                summary = suggestions_text = combined
+    else:
+        # Prompts are independent, so issue both provider calls concurrently
+        summary, suggestions_text = await asyncio.gather(
+            call_llm(_SUMMARY_TMPL.format_map(fields)), call_llm(_SUGGESTIONS_PROMPT)
+        )
+    suggestions = parse_suggestions(suggestions_text)
 
     # Structure sections
-    projects_struct = [
-        {"title": p.split(" - ")[0], "description": p, "impact": ""} for p in data.projects
-    ]
-    experience_struct = [
-        {"role": e.split(" at ")[0], "details": e, "achievements": []} for e in data.experience
-    ]
-    education_struct = [
-        {"program": e, "institution": "", "year": ""} for e in data.education
-    ]
-
-    result = AIGenerateResult(
+    projects_struct = structure_projects(data.projects)
+    experience_struct = structure_experience(data.experience)
+    education_struct = structure_education(data.education)
+
+    # Fields are assembled server-side from already-validated input, so skip re-validation
+    result = AIGenerateResult.model_construct(
         summary=summary,
         skills=data.skills or [],
         projects=projects_struct,
@@ -134,16 +340,16 @@ def generate_portfolio(data: AIGenerateInput):
         contact={"email": data.contact_email or "", "name": name},
         suggestions=suggestions,
     )
-    return result
+    return result.model_dump()
 
 
-@app.post("/api/suggest")
-def ai_suggest(payload: AISuggestRequest):
+@app.post("/api/suggest", openapi_extra=json_body_schema(AISuggestRequest))
+async def ai_suggest(payload: AISuggestRequest = Depends(json_body(AISuggestRequest))):
     prompt = (
         f"Improve the following text for {payload.tone} tone. Keep it concise, clear, and action-oriented.\n\n"
         f"Text: {payload.text}"
     )
-    improved = call_llm(prompt)
+    improved = await call_llm(prompt)
     return {"improved": improved}
 
 
@@ -161,56 +367,129 @@ class SavePortfolioRequest(BaseModel):
     assets: Dict[str, Any] = {}
 
 
-@app.post("/api/portfolio/save")
-def save_portfolio(payload: SavePortfolioRequest):
-    # Ensure username uniqueness
-    exists = get_documents("portfolio", {"username": payload.username})
-    if exists:
-        # Upsert-like behavior: replace latest
-        try:
-            from bson import ObjectId
-            # delete existing then insert new for simplicity
-            db.portfolio.delete_many({"username": payload.username})
-        except Exception:
-            pass
-    pid = create_document("portfolio", payload.model_dump())
-    return {"id": pid, "username": payload.username}
+# Fields served on the public /u/{username} page
+PUBLIC_PORTFOLIO_PROJECTION = {
+    "_id": 1, "username": 1, "name": 1, "theme": 1, "dark_mode": 1,
+    "sections": 1, "seo_title": 1, "seo_description": 1, "assets": 1,
+}
+# The editor also needs owner_email (required to re-save) and timestamps
+PORTFOLIO_PROJECTION = {
+    **PUBLIC_PORTFOLIO_PROJECTION, "owner_email": 1, "created_at": 1, "updated_at": 1,
+}
 
 
-@app.get("/api/portfolio/{username}")
-def get_portfolio(username: str):
-    docs = get_documents("portfolio", {"username": username})
-    if not docs:
+def _find_portfolio(username: str, projection: Dict[str, int]):
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    doc = db.portfolio.find_one({"username": username}, projection=projection)
+    if not doc:
         raise HTTPException(status_code=404, detail="Portfolio not found")
-    doc = docs[-1]
     doc["_id"] = str(doc.get("_id"))
     return doc
 
 
+@app.post("/api/portfolio/save", openapi_extra=json_body_schema(SavePortfolioRequest))
+def save_portfolio(payload: SavePortfolioRequest = Depends(json_body(SavePortfolioRequest))):
+    # One document per username: replace in place, or insert on first save
+    pid = upsert_document("portfolio", {"username": payload.username}, payload.model_dump())
+    _evict_public(payload.username)
+    return {"id": pid, "username": payload.username}
+
+
+@app.get("/api/portfolio/{username}")
+def get_portfolio(username: str):
+    return _find_portfolio(username, PORTFOLIO_PROJECTION)
+
+
 # ---- API: File upload stubs ----
 
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...)):
     # In this environment we store to DB as metadata only; in production use S3 or similar
-    content = await file.read()
+    # Stream in 1 MiB chunks so memory stays flat regardless of file size
+    size = 0
+    digest = hashlib.blake2b(digest_size=16)
+    while chunk := await file.read(1 << 20):
+        size += len(chunk)
+        digest.update(chunk)
     meta = {
         "filename": file.filename,
         "content_type": file.content_type,
-        "size": len(content),
+        "size": size,
+        "blake2b": digest.hexdigest(),
     }
-    fid = create_document("uploads", meta)
+    # pymongo is blocking; keep it off the event loop in this async handler
+    fid = await run_in_threadpool(create_document, "uploads", meta)
     return {"file_id": fid, "meta": meta}
 
 
 # ---- Public hosting route (server-side render JSON → consumed by frontend router) ----
 
+# Short-lived per-process cache of serialized public pages; save_portfolio evicts the entry.
+# TTLCache isn't thread-safe and sync handlers run on the threadpool, so every access
+# holds _public_cache_lock. The generation counter is bumped on each save so a fetch
+# that read the database before the save doesn't write its stale copy back.
+_public_cache = TTLCache(maxsize=2048, ttl=60)
+_public_cache_lock = threading.Lock()
+_public_generation = 0
+
+
+def _evict_public(username: str):
+    global _public_generation
+    with _public_cache_lock:
+        _public_generation += 1
+        _public_cache.pop(username, None)
+
+
+def _fetch_public(username: str):
+    with _public_cache_lock:
+        entry = _public_cache.get(username)
+        generation = _public_generation
+    if entry is not None:
+        return entry
+    body = orjson.dumps(_find_portfolio(username, PUBLIC_PORTFOLIO_PROJECTION), default=str)
+    entry = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+    with _public_cache_lock:
+        if generation == _public_generation:
+            _public_cache[username] = entry
+    return entry
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # RFC 7232 weak comparison over a comma-separated list; proxies that compress
+    # often rewrite our tag as W/"..."
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
 @app.get("/u/{username}")
-def public_portfolio(username: str):
-    # Same as get_portfolio but optimized for public
-    return get_portfolio(username)
+def public_portfolio(username: str, request: Request):
+    # Public subset of the portfolio, served from cache with an ETag for conditional requests
+    body, etag = _fetch_public(username)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Multi-worker mode needs the app as an import string. loop="auto" picks uvloop
+    # when installed (it isn't on Windows) and falls back to asyncio otherwise.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        loop="auto",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        log_level="warning",
+    )
@@ -0,0 +1,33 @@
+"""
+Result structuring helpers for the AI generation endpoint
+
+Kept free of FastAPI/Pydantic imports so the module can be compiled with Cython
+(see setup.py). The plain-Python import works unchanged when no build is present.
+"""
+
+from typing import List, Dict, Any
+
+
+def parse_suggestions(text: str, limit: int = 5) -> List[str]:
+    """Collect up to `limit` non-empty bullet lines, stripping list markers."""
+    suggestions = []
+    # Stop scanning as soon as enough bullets are collected
+    for line in text.splitlines():
+        stripped = line.lstrip("-•* ").strip()
+        if stripped:
+            suggestions.append(stripped)
+            if len(suggestions) == limit:
+                break
+    return suggestions
+
+
+def structure_projects(projects: List[str]) -> List[Dict[str, Any]]:
+    return [{"title": p.partition(" - ")[0], "description": p, "impact": ""} for p in projects]
+
+
+def structure_experience(experience: List[str]) -> List[Dict[str, Any]]:
+    return [{"role": e.partition(" at ")[0], "details": e, "achievements": []} for e in experience]
+
+
+def structure_education(education: List[str]) -> List[Dict[str, Any]]:
+    return [{"program": e, "institution": "", "year": ""} for e in education]
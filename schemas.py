@@ -5,28 +5,36 @@ Each Pydantic model represents a collection in MongoDB.
 Collection name is the lowercase of the class name by convention.
 """
 
+from types import MappingProxyType
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, ConfigDict, Field, EmailStr
+
+# Read-only template; each User gets a fresh dict copy without a per-instance lambda
+_DEFAULT_SOCIAL = MappingProxyType({"github": None, "linkedin": None, "website": None})
 
 
 class User(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
     name: str
     email: EmailStr
     username: str = Field(..., description="Unique handle for public portfolio URL")
     avatar_url: Optional[str] = None
     headline: Optional[str] = None
-    social: Dict[str, Optional[str]] = Field(
-        default_factory=lambda: {"github": None, "linkedin": None, "website": None}
-    )
+    social: Dict[str, Optional[str]] = Field(default_factory=_DEFAULT_SOCIAL.copy)
 
 
 class PortfolioSection(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
     key: str  # summary, skills, projects, experience, education, achievements, contact
     title: str
     content: Any  # string or structured list
 
 
 class Portfolio(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
     owner_email: EmailStr
     username: str = Field(..., description="Public slug e.g., yoursite.com/username")
     name: str
@@ -39,6 +47,8 @@ class Portfolio(BaseModel):
 
 
 class AIGenerateInput(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
     name: str
     skills: List[str] = []
     education: List[str] = []
@@ -50,6 +60,8 @@ class AIGenerateInput(BaseModel):
 
 
 class AIGenerateResult(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
     summary: str
     skills: List[str]
     projects: List[Dict[str, Any]]
@@ -0,0 +1,24 @@
+"""
+Optional native build of the hot structuring helpers.
+
+    pip install cython
+    python setup.py build_ext --inplace
+
+Produces a compiled main_helpers extension that Python imports in preference
+to main_helpers.py. The FastAPI app and Pydantic schemas stay pure Python.
+"""
+
+from setuptools import setup
+
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    raise SystemExit(
+        "setup.py only builds the optional Cython extension for main_helpers; "
+        "install Cython first (pip install cython). The app itself needs no build step."
+    )
+
+setup(
+    name="ai-portfolio-builder-helpers",
+    ext_modules=cythonize(["main_helpers.py"], language_level=3),
+)